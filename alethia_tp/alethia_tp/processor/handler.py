@@ -15,6 +15,8 @@
 
 import logging
 import hashlib
+import threading
+from collections import OrderedDict
 
 import cbor
 import json  # for debugging
@@ -38,6 +40,9 @@ ALETHIA_ADDRESS_PREFIX = \
 # maximum number of elements per page
 MAX_PAGE_SIZE = 1024
 
+# maximum number of parsed pages kept by each handler
+PAGE_CACHE_SIZE = 256
+
 def unpack_page_object(page_object):
   meta, data = page_object.split(b"|", 1)
   prev_addr, next_addr, size = meta.split(b",", 2)
@@ -60,7 +65,55 @@ def pack_page_object(page):
   )
 
 
+class PageCache(object):
+  """
+  A bounded LRU cache of parsed pages, keyed by address. Each entry remembers
+  the packed state it was parsed from, and is only returned while the state at
+  that address still holds exactly those bytes, so pages rolled back by a fork
+  or written by another processor are never served stale.
+  """
+
+  def __init__(self, max_size=PAGE_CACHE_SIZE):
+    self._max_size = max_size
+    self._pages = OrderedDict()
+    self._lock = threading.Lock()
+
+  def peek(self, addr):
+    """
+    Returns the last page stored at `addr`, without validating it against
+    state. Only useful as a hint.
+    """
+    with self._lock:
+      entry = self._pages.get(addr)
+    return None if entry is None else entry[1]
+
+  def get(self, addr, page_object):
+    """
+    Returns a copy of the parsed page at `addr`, parsing `page_object` only if
+    it differs from what is cached.
+    """
+    with self._lock:
+      entry = self._pages.get(addr)
+      if entry is not None and entry[0] == page_object:
+        self._pages.move_to_end(addr)
+        return dict(entry[1])
+
+    page = unpack_page_object(page_object)
+    self.put(addr, page_object, page)
+    return dict(page)
+
+  def put(self, addr, page_object, page):
+    with self._lock:
+      self._pages[addr] = (page_object, dict(page))
+      self._pages.move_to_end(addr)
+      while len(self._pages) > self._max_size:
+        self._pages.popitem(last=False)
+
+
 class AlethiaTransactionHandler(TransactionHandler):
+  def __init__(self, page_cache_size=PAGE_CACHE_SIZE):
+    self._pages = PageCache(page_cache_size)
+
   @property
   def family_name(self):
     return FAMILY_NAME
@@ -86,13 +139,20 @@ class AlethiaTransactionHandler(TransactionHandler):
     head_addr = payload["log_id"] + "{:016x}".format(0)
     # LOGGER.debug("First page: {}".format(head_addr))
 
-    tags = context.get_state([head_addr])
-    if len(tags) == 0:
+    # If we have seen this log before, fetch the head and the tail we expect
+    # in one round trip; the guess is checked against the head below.
+    addrs = [head_addr]
+    cached_head = self._pages.peek(head_addr)
+    if cached_head is not None and cached_head["prev"] != head_addr:
+      addrs.append(cached_head["prev"])
+    state = {entry.address: entry.data for entry in context.get_state(addrs)}
+
+    if head_addr not in state:
       # For now, pretend a "create" action was issued
       head_page = {"prev": head_addr, "next": head_addr, "size": 0, "data": b""}
       changes[head_addr] = head_page
     else:
-      head_page = unpack_page_object(tags[0].data)
+      head_page = self._pages.get(head_addr, state[head_addr])
 
     # LOGGER.debug("Contents of head: {}".format(head_page))
 
@@ -102,11 +162,13 @@ class AlethiaTransactionHandler(TransactionHandler):
     if tail_addr == head_addr:
       tail_page = head_page
     else:
-      tags = context.get_state([tail_addr])
-      if len(tags) == 0:
-        raise InternalError("Unexpected dangling address")
+      if tail_addr not in state:
+        tags = context.get_state([tail_addr])
+        if len(tags) == 0:
+          raise InternalError("Unexpected dangling address")
+        state[tail_addr] = tags[0].data
 
-      tail_page = unpack_page_object(tags[0].data)
+      tail_page = self._pages.get(tail_addr, state[tail_addr])
 
     # LOGGER.debug("Contents of tail: {}".format(tail_page))
 
@@ -131,6 +193,9 @@ class AlethiaTransactionHandler(TransactionHandler):
     changes[tail_addr] = tail_page
     # LOGGER.debug("New tail: {}".format(tail_page))
 
-    context.set_state({k: pack_page_object(v) for k, v in changes.items()})
+    packed = {k: pack_page_object(v) for k, v in changes.items()}
+    context.set_state(packed)
+    for k, v in changes.items():
+      self._pages.put(k, packed[k], v)
 
     LOGGER.debug("Appended to page {}".format(int(tail_addr[-16:], 16)))
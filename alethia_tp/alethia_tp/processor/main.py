@@ -17,6 +17,7 @@ import sys
 import argparse
 import pkg_resources
 import logging
+import multiprocessing
 
 from sawtooth_sdk.processor.core import TransactionProcessor
 from sawtooth_sdk.processor.log import init_console_logging
@@ -44,6 +45,15 @@ def parse_args(args):
             default=0,
             help='Increase output sent to stderr')
 
+  parser.add_argument(
+    '-w', '--workers',
+    type=int,
+    default=1,
+    help='Number of transaction processor worker processes to run.\n'
+         'Each worker keeps its own page cache, so a worker whose cached\n'
+         'tail page of a log was filled by another worker pays one extra\n'
+         'state read on its next append to that log.')
+
   parser.add_argument(
     '-V', '--version',
     action='version',
@@ -53,10 +63,7 @@ def parse_args(args):
   return parser.parse_args(args)
 
 
-def main(args=None):
-  if args is None:
-    args = sys.argv[1:]
-  opts = parse_args(args)
+def run_processor(opts):
   processor = None
   try:
     processor = TransactionProcessor(url=opts.connect)
@@ -91,3 +98,28 @@ def main(args=None):
   finally:
     if processor is not None:
       processor.stop()
+
+
+def main(args=None):
+  if args is None:
+    args = sys.argv[1:]
+  opts = parse_args(args)
+
+  if opts.workers <= 1:
+    run_processor(opts)
+    return
+
+  # Each worker registers its own processor with the validator, which spreads
+  # transactions across them.
+  workers = [
+    multiprocessing.Process(target=run_processor, args=(opts,))
+    for _ in range(opts.workers)
+  ]
+  for worker in workers:
+    worker.start()
+  try:
+    for worker in workers:
+      worker.join()
+  except KeyboardInterrupt:
+    for worker in workers:
+      worker.join()
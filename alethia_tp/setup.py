@@ -39,7 +39,7 @@ setup(
   description="Alethia Transaction Processor for Hyperledger Sawtooth",
   author="Hyperledger Sawtooth",
   url="",
-  packages=find_packages(),
+  packages=find_packages(exclude=["tests", "tests.*"]),
   install_requires=[
     "cbor",
     "colorlog",
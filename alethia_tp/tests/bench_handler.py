@@ -0,0 +1,73 @@
+"""
+Measures AlethiaTransactionHandler apply throughput with and without its page
+cache, appending to a few busy logs through an in-memory state context.
+With --workers N, each transaction goes to one of N handlers with separate
+caches, picked at random, as the validator spreads them across --workers
+processes without regard to which log they append to.
+
+Run from alethia_tp/:
+  python -m tests.bench_handler --appends 20000 --logs 4 --latency 0.0001
+"""
+import argparse
+import hashlib
+import random
+import sys
+import time
+
+from alethia_tp.processor.handler import AlethiaTransactionHandler
+from alethia_tp.processor.handler import PAGE_CACHE_SIZE
+from tests.context import FakeContext
+from tests.context import FakeTransaction
+
+
+def run(page_cache_size, transactions, latency, workers=1):
+  handlers = [AlethiaTransactionHandler(page_cache_size=page_cache_size)
+              for _ in range(workers)]
+  picks = random.Random(0)
+  context = FakeContext(latency=latency)
+  start_time = time.time()
+  for transaction in transactions:
+    picks.choice(handlers).apply(transaction, context)
+  elapsed_time = time.time() - start_time
+  return len(transactions) / elapsed_time, context
+
+
+def parse_args(args):
+  parser = argparse.ArgumentParser(description=__doc__,
+    formatter_class=argparse.RawDescriptionHelpFormatter)
+  parser.add_argument("--appends", type=int, default=20000,
+    help="Number of transactions to apply")
+  parser.add_argument("--logs", type=int, default=4,
+    help="Number of logs the appends are spread across")
+  parser.add_argument("--latency", type=float, default=0.0001,
+    help="Seconds each get_state call takes, standing in for the validator")
+  parser.add_argument("--workers", type=int, default=1,
+    help="Number of handlers, each with its own cache, sharing the appends")
+  return parser.parse_args(args)
+
+
+def main(args=None):
+  if args is None:
+    args = sys.argv[1:]
+  opts = parse_args(args)
+
+  family = hashlib.sha512(b"alethia").hexdigest()[0:6]
+  log_ids = [family + "{:048x}".format(i) for i in range(opts.logs)]
+  transactions = [
+    FakeTransaction(log_ids[i % opts.logs], hashlib.sha256(str(i).encode()).hexdigest())
+    for i in range(opts.appends)
+  ]
+
+  uncached, uncached_context = run(0, transactions, opts.latency)
+  cached, cached_context = run(PAGE_CACHE_SIZE, transactions, opts.latency,
+                               max(1, opts.workers))
+  print("uncached: {:.0f} tx/s, {} get_state calls".format(
+    uncached, uncached_context.get_state_calls))
+  print("cached:   {:.0f} tx/s, {} get_state calls".format(
+    cached, cached_context.get_state_calls))
+  print("speedup:  {:.2f}x, same state: {}".format(
+    cached / uncached, cached_context.state == uncached_context.state))
+
+
+if __name__ == "__main__":
+  main()
@@ -0,0 +1,43 @@
+"""
+An in-memory stand-in for the validator's state context, for exercising
+AlethiaTransactionHandler without a validator.
+"""
+import time
+
+import cbor
+
+from sawtooth_sdk.protobuf.transaction_pb2 import TransactionHeader
+
+
+class StateEntry(object):
+  def __init__(self, address, data):
+    self.address = address
+    self.data = data
+
+
+class FakeTransaction(object):
+  def __init__(self, log_id, data):
+    self.header = TransactionHeader(signer_public_key="00")
+    self.payload = cbor.dumps({"action": "append", "log_id": log_id, "data": data})
+
+
+class FakeContext(object):
+  """
+  Holds state in a dict. `latency` seconds are spent on every get_state call
+  to stand in for the round trip to the validator.
+  """
+
+  def __init__(self, state=None, latency=0.0):
+    self.state = dict(state or {})
+    self.latency = latency
+    self.get_state_calls = 0
+
+  def get_state(self, addresses):
+    self.get_state_calls += 1
+    if self.latency:
+      time.sleep(self.latency)
+    return [StateEntry(a, self.state[a]) for a in addresses if a in self.state]
+
+  def set_state(self, entries):
+    self.state.update(entries)
+    return list(entries)
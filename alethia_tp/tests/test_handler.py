@@ -0,0 +1,56 @@
+import hashlib
+import unittest
+
+from alethia_tp.processor.handler import AlethiaTransactionHandler
+from alethia_tp.processor.handler import MAX_PAGE_SIZE
+from tests.context import FakeContext
+from tests.context import FakeTransaction
+
+LOG_ID = hashlib.sha512(b"alethia").hexdigest()[0:6] + "0" * 48
+
+
+def apply_all(handler, context, start, count):
+  for i in range(start, start + count):
+    handler.apply(FakeTransaction(LOG_ID, "{:064x}".format(i)), context)
+
+
+class PageCacheTest(unittest.TestCase):
+  def reference_state(self, state, start, count):
+    """
+    The state an uncached handler reaches from `state`.
+    """
+    context = FakeContext(state)
+    apply_all(AlethiaTransactionHandler(page_cache_size=0), context, start, count)
+    return context.state
+
+  def test_matches_uncached_handler(self):
+    context = FakeContext()
+    apply_all(AlethiaTransactionHandler(), context, 0, 2 * MAX_PAGE_SIZE + 5)
+    self.assertEqual(context.state, self.reference_state({}, 0, 2 * MAX_PAGE_SIZE + 5))
+
+  def test_rereads_page_rolled_back_by_fork(self):
+    handler = AlethiaTransactionHandler()
+    context = FakeContext()
+    apply_all(handler, context, 0, MAX_PAGE_SIZE - 2)
+    fork_point = dict(context.state)
+
+    # Cross a page boundary, then fall back to the earlier block.
+    apply_all(handler, context, MAX_PAGE_SIZE - 2, 5)
+    context = FakeContext(fork_point)
+    apply_all(handler, context, 5000, 5)
+
+    self.assertEqual(context.state, self.reference_state(fork_point, 5000, 5))
+
+  def test_rereads_page_written_by_another_processor(self):
+    handler = AlethiaTransactionHandler()
+    context = FakeContext()
+    apply_all(handler, context, 0, 10)
+    apply_all(AlethiaTransactionHandler(), context, 10, MAX_PAGE_SIZE)
+    before = dict(context.state)
+    apply_all(handler, context, 5000, 3)
+
+    self.assertEqual(context.state, self.reference_state(before, 5000, 3))
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Backfill uploads the log-hashes of an existing (possibly rotated) log to the
+blockchain. It skips lines that are already anchored on chain, submits the
+rest in large batches, and checkpoints its progress so an interrupted backfill
+resumes where it stopped without appending duplicates.
+
+Example:
+  python3 backfill.py www.website.com syslog /var/log/syslog --key-file key.hex
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+import logsource
+import submitter
+import verifier
+
+
+def load_checkpoint(path):
+  """
+  Reads a backfill checkpoint, or returns an empty one if none exists yet.
+  """
+  if not os.path.exists(path):
+    return {"line": 0, "last_transaction": None, "pending": []}
+  with open(path, "r") as f:
+    return json.load(f)
+
+def save_checkpoint(path, checkpoint):
+  """
+  Durably replaces the checkpoint at `path`: the new contents are written to a
+  temporary file and fsynced before being renamed over the old checkpoint.
+  """
+  tmp_path = path + ".tmp"
+  with open(tmp_path, "w") as f:
+    json.dump(checkpoint, f)
+    f.flush()
+    os.fsync(f.fileno())
+  os.replace(tmp_path, path)
+  directory = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+  try:
+    os.fsync(directory)
+  finally:
+    os.close(directory)
+
+# When a batch's status differs between REST APIs, the most advanced one wins.
+_STATUS_ORDER = ["UNKNOWN", "INVALID", "PENDING", "COMMITTED"]
+
+def get_statuses(alethia_log, pending, wait):
+  """
+  Gets the status of every batch in `pending` from the REST API that accepted
+  it; other validators may not have heard of it yet. Batches whose endpoint is
+  unknown (the submission failed or was interrupted) are queried on every
+  endpoint. Returns `{BATCH_ID: STATUS}`, or False on an HTTP error.
+  """
+  by_endpoint = {}
+  for p in pending:
+    endpoints = [p.get("endpoint")] if p.get("endpoint") else alethia_log.endpoints
+    for endpoint in endpoints:
+      by_endpoint.setdefault(endpoint, []).append(p["batch"])
+
+  statuses = {}
+  for endpoint, batch_ids in by_endpoint.items():
+    result = alethia_log.get_batch_statuses(batch_ids, wait, endpoint=endpoint)
+    if result is False:
+      return False
+    for batch_id, status in result.items():
+      old = statuses.get(batch_id, "UNKNOWN")
+      if _STATUS_ORDER.index(status) >= _STATUS_ORDER.index(old):
+        statuses[batch_id] = status
+  return statuses
+
+def wait_for_batches(alethia_log, pending, wait, max_wait):
+  """
+  Waits for the batches in `pending` (a list of `{batch, last_transaction,
+  endpoint}` records, oldest first) to leave the PENDING state. Returns the
+  records that committed, in order, stopping at the first one that did not.
+  Each batch depends on the one before it, so once a batch is INVALID or
+  UNKNOWN the ones after it can never commit and are not waited for.
+  Returns False on an HTTP error, or if a batch is still pending after
+  `max_wait` seconds.
+  """
+  deadline = time.time() + max_wait
+  statuses = {}
+  remaining = list(pending)
+  while remaining:
+    result = get_statuses(alethia_log, remaining, wait)
+    if result is False:
+      return False
+    statuses.update(result)
+    for i, p in enumerate(pending):
+      if statuses.get(p["batch"]) not in ("COMMITTED", "PENDING"):
+        pending = pending[:i + 1]
+        break
+    remaining = [p for p in pending if statuses.get(p["batch"]) == "PENDING"]
+    if remaining and time.time() >= deadline:
+      print(str(len(remaining)) + " batches still pending after " + str(max_wait) + " seconds")
+      return False
+    if remaining:
+      time.sleep(1)
+
+  committed = []
+  for p in pending:
+    if statuses.get(p["batch"]) != "COMMITTED":
+      print("Batch " + p["batch"] + " " + str(statuses.get(p["batch"])))
+      break
+    committed.append(p)
+  return committed
+
+def backfill(alethia_log, log_source, checkpoint_path, *,
+             chunk_lines=1000, batch_size=100, window=4, wait=30, max_wait=600):
+  """
+  Uploads the log-hashes of `log_source` that are not yet on chain.
+
+  alethia_log: A submitter.AlethiaLog handle. No other client should be
+    appending to this log while the backfill runs.
+  log_source: A logsource.RotatedLog whose line numbers match on-chain entries.
+  checkpoint_path: File recording progress and in-flight batches.
+  chunk_lines: Number of lines submitted per REST request.
+  batch_size: Number of transactions per batch.
+  window: Number of requests allowed in flight before waiting for the oldest
+    one to commit.
+  wait: Seconds to wait on each batch status query.
+  max_wait: Seconds to wait for submitted batches to commit before giving up;
+    they stay in the checkpoint for the next run.
+
+  Returns True once every line is anchored, or False if the backfill stopped
+  on an error; running it again resumes from the checkpoint.
+  """
+  start_time = time.time()
+  checkpoint = load_checkpoint(checkpoint_path)
+
+  # Settle anything submitted before the last run stopped, so the on-chain
+  # entry count is final before we decide where to resume.
+  if checkpoint["pending"]:
+    committed = wait_for_batches(alethia_log, checkpoint["pending"], wait, max_wait)
+    if committed is False:
+      return False
+    if committed:
+      checkpoint["last_transaction"] = committed[-1]["last_transaction"]
+    checkpoint["pending"] = []
+    save_checkpoint(checkpoint_path, checkpoint)
+
+  tail = alethia_log.get_log_tail()
+  if tail is False:
+    return False
+  line, last_entry, _, _ = tail
+  if line != checkpoint["line"]:
+    print("Checkpoint at line " + str(checkpoint["line"]) + ", chain at line " + str(line))
+    checkpoint["line"] = line
+  alethia_log.set_last_transaction_sig(checkpoint["last_transaction"])
+  first_line = line
+
+  # Make sure the chain and the file agree on where we are: if logrotate has
+  # deleted a segment and --first-line was not updated, resuming at `line`
+  # would silently skip the deleted segment's worth of lines.
+  if line < log_source.first_line:
+    print("The chain holds " + str(line) + " entries, fewer than the first line on disk ("
+          + str(log_source.first_line) + "); check --first-line")
+    return False
+  if line > log_source.first_line:
+    stream = log_source.lines(line - 1)
+    previous = next(stream, None)
+    if previous is None:
+      print("The chain holds " + str(line) + " entries, more than the log has lines;"
+            " check --first-line")
+      return False
+    if verifier.gen_hash_of_line_sha256(previous[1]) != last_entry:
+      print("Line " + str(line - 1) + " of the log does not match the last on-chain entry;"
+            " if logrotate deleted old segments, check --first-line")
+      return False
+  else:
+    stream = log_source.lines(line)
+
+  # Each in-flight record is a request's batches plus the line after them.
+  in_flight = []
+
+  def settle(records):
+    committed = wait_for_batches(
+      alethia_log, [p for r in records for p in r["pending"]], wait, max_wait)
+    if committed is False:
+      return False
+    committed_ids = set(p["batch"] for p in committed)
+    for r in records:
+      if not all(p["batch"] in committed_ids for p in r["pending"]):
+        return False
+      checkpoint["line"] = r["line"]
+      checkpoint["last_transaction"] = r["pending"][-1]["last_transaction"]
+    checkpoint["pending"] = [p for r in in_flight for p in r["pending"]]
+    save_checkpoint(checkpoint_path, checkpoint)
+    return True
+
+  def submit(hashes, end_line):
+    # Record the signed batches durably before they are sent: if we die, or
+    # the request fails, after a node has accepted them, the next run still
+    # knows to wait for them instead of sending the same lines again.
+    batches = alethia_log.make_batches(hashes, batch_size)
+    record = {
+      "line": end_line,
+      "pending": [{
+        "batch": b.header_signature,
+        "last_transaction": b.transactions[-1].header_signature,
+        "endpoint": None,
+      } for b in batches],
+    }
+    in_flight.append(record)
+    checkpoint["pending"] = [p for r in in_flight for p in r["pending"]]
+    save_checkpoint(checkpoint_path, checkpoint)
+    endpoint = alethia_log.submit_batches(batches)
+    if not endpoint:
+      return False
+    for p in record["pending"]:
+      p["endpoint"] = endpoint
+    save_checkpoint(checkpoint_path, checkpoint)
+    while len(in_flight) > window:
+      if not settle([in_flight.pop(0)]):
+        return False
+    return True
+
+  hashes = []
+  ok = True
+  for line_number, log_line in stream:
+    hashes.append(verifier.gen_hash_of_line_sha256(log_line))
+    line = line_number + 1
+    if len(hashes) >= chunk_lines:
+      ok = submit(hashes, line)
+      hashes = []
+      if not ok:
+        break
+  if ok and hashes:
+    ok = submit(hashes, line)
+  if ok:
+    records, in_flight[:] = list(in_flight), []
+    ok = settle(records)
+
+  elapsed_time = time.time() - start_time
+  print(str(elapsed_time) + " seconds to backfill lines " + str(first_line)
+        + " to " + str(checkpoint["line"]) + " of " + str(log_source.path))
+  return ok
+
+def parse_args(args):
+  parser = argparse.ArgumentParser(
+    description="Upload the log-hashes of an existing log, resuming from a checkpoint.")
+  parser.add_argument("host", help="Host whose log is being backfilled")
+  parser.add_argument("log", help="Log name relative to the host. Example: syslog")
+  parser.add_argument("path", help="Path to the live log file. Example: /var/log/syslog")
+  parser.add_argument("--api-url", action="append",
+    help="URL of a Sawtooth REST API; repeat to spread requests across validators"
+         " (default: http://rest-api:8008)")
+  parser.add_argument("--key-file",
+    help="File holding a hex-encoded private key (a new key is made if omitted)")
+  parser.add_argument("--checkpoint",
+    help="Checkpoint file (default: ./<host>-<log>.backfill.json)")
+  parser.add_argument("--first-line", type=int, default=0,
+    help="Line number of the oldest rotated segment still on disk")
+  parser.add_argument("--chunk-lines", type=int, default=1000,
+    help="Lines submitted per request")
+  parser.add_argument("--batch-size", type=int, default=100,
+    help="Transactions per batch")
+  parser.add_argument("--window", type=int, default=4,
+    help="Requests in flight before waiting for commits")
+  parser.add_argument("--max-wait", type=int, default=600,
+    help="Seconds to wait for submitted batches to commit before stopping")
+  parser.add_argument("--workers", type=int, default=4,
+    help="Rotated segments decompressed in parallel")
+  return parser.parse_args(args)
+
+def main(args=None):
+  if args is None:
+    args = sys.argv[1:]
+  opts = parse_args(args)
+
+  if opts.key_file is not None:
+    private_key_hex = open(opts.key_file, "r").read().strip()
+  else:
+    private_key_hex = submitter.make_private_key_hex()
+  checkpoint_path = opts.checkpoint or "./{}-{}.backfill.json".format(opts.host, opts.log)
+
+  api_urls = opts.api_url or ["http://rest-api:8008"]
+  alethia = submitter.Alethia(opts.host, private_key_hex, api_url=api_urls)
+  log = alethia.get_log_handle(opts.log)
+  log_source = logsource.RotatedLog(
+    opts.path, first_line=opts.first_line, workers=opts.workers)
+  ok = backfill(log, log_source, checkpoint_path,
+    chunk_lines=opts.chunk_lines, batch_size=opts.batch_size, window=opts.window,
+    max_wait=opts.max_wait)
+  return 0 if ok else 1
+
+if __name__ == "__main__":
+  sys.exit(main())
@@ -0,0 +1,323 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Log sources present a rotated log (syslog, syslog.1, syslog.2.gz, ...) as one
+contiguous stream of lines with stable global line numbers. Global line N is
+the Nth entry appended to the Alethia log, so each segment maps onto a span of
+on-chain pages.
+"""
+import gzip
+import io
+import os
+import queue
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+  import zstandard
+except ImportError:
+  zstandard = None
+
+from submitter import PAGE_SIZE
+
+# Number of lines handed from a decompression thread to the reader at a time,
+# and how many such chunks each thread may buffer ahead of the reader.
+CHUNK_LINES = 4096
+CHUNK_BACKLOG = 4
+
+_CODECS = {"": None, ".gz": "gzip", ".zst": "zstd"}
+_DONE = object()
+
+
+class LogSegment(object):
+  """
+  A single file in a rotated log set. `first_line` and `line_count` are filled
+  in once the segment has been indexed by its `RotatedLog`.
+  """
+
+  def __init__(self, path, codec=None, live=False):
+    """
+    path: Path to the segment on disk.
+    codec: None for plain text, "gzip" or "zstd" for compressed segments.
+    live: True for the segment still being written to. Its last line is
+      skipped until the writer has terminated it.
+    """
+    self.path = path
+    self.codec = codec
+    self.live = live
+    self.first_line = None
+    self.line_count = None
+
+  def __repr__(self):
+    return "LogSegment({!r}, first_line={}, line_count={})".format(
+      self.path, self.first_line, self.line_count)
+
+  def open(self):
+    """
+    Opens the segment as a text stream, decompressing it on the fly.
+    """
+    if self.codec == "gzip":
+      return gzip.open(self.path, "rt", encoding="utf-8")
+    if self.codec == "zstd":
+      if zstandard is None:
+        raise RuntimeError(
+          "Reading " + self.path + " requires the 'zstandard' package")
+      raw = open(self.path, "rb")
+      reader = zstandard.ZstdDecompressor().stream_reader(raw, closefd=True)
+      return io.TextIOWrapper(reader, encoding="utf-8")
+    return open(self.path, "r", encoding="utf-8")
+
+  def lines(self):
+    """
+    Yields the lines of this segment without their line terminators. A live
+    segment's final line is only yielded once it ends in a newline, so a
+    half-written line is never hashed.
+    """
+    with self.open() as f:
+      for line in f:
+        if self.live and not line.endswith("\n"):
+          return
+        yield line.rstrip("\n")
+
+  def count_lines(self):
+    """
+    Counts the lines in this segment (decompressing it if necessary).
+    """
+    count = 0
+    for _ in self.lines():
+      count += 1
+    return count
+
+  def page_span(self):
+    """
+    Returns the `(first_page, last_page)` range of on-chain pages holding the
+    hashes of this segment's lines, inclusive. Returns None for an empty or
+    unindexed segment.
+    """
+    if not self.line_count or self.first_line is None:
+      return None
+    last_line = self.first_line + self.line_count - 1
+    return (self.first_line // PAGE_SIZE, last_line // PAGE_SIZE)
+
+
+def find_log_segments(path):
+  """
+  Finds the rotated segments of the log at `path`, oldest first. Recognises
+  logrotate's numbered scheme, optionally gzip- or zstd-compressed:
+  syslog.3.gz, syslog.2.zst, syslog.1, syslog.
+
+  Example:
+    [s.path for s in find_log_segments("/var/log/syslog")]
+    == ["/var/log/syslog.2.gz", "/var/log/syslog.1", "/var/log/syslog"]
+  """
+  directory, base = os.path.split(os.path.abspath(path))
+  pattern = re.compile(
+    "^" + re.escape(base) + r"(?:\.(\d+))?(\.gz|\.zst)?$")
+
+  found = []
+  for name in os.listdir(directory):
+    match = pattern.match(name)
+    if match is None:
+      continue
+    index = int(match.group(1)) if match.group(1) is not None else 0
+    codec = _CODECS[match.group(2) or ""]
+    live = index == 0 and codec is None
+    found.append((index, LogSegment(os.path.join(directory, name), codec, live)))
+
+  # Higher rotation indices are older; the live file (index 0) comes last.
+  found.sort(key=lambda pair: pair[0], reverse=True)
+  return [segment for _, segment in found]
+
+
+class RotatedLog(object):
+  """
+  A `RotatedLog` presents a set of rotated log segments as one contiguous
+  stream of lines. Segments are decompressed in parallel background threads,
+  a bounded number of lines ahead of the reader, so weeks of compressed
+  history can be uploaded or verified without unpacking it to disk.
+  """
+
+  def __init__(self, path, *, first_line=0, workers=4, segments=None):
+    """
+    path: Path to the live log file. Example: "/var/log/syslog"
+    first_line: Global line number of the first line of the oldest segment
+      still on disk. Once logrotate has deleted old segments, pass the number
+      of lines they held so line numbers keep matching on-chain entries.
+    workers: Maximum number of segments decompressed concurrently.
+    segments: An explicit list of `LogSegment`s, oldest first. Defaults to
+      the result of `find_log_segments(path)`.
+    """
+    self.path = path
+    self.first_line = first_line
+    self.workers = max(1, workers)
+    self.segments = segments if segments is not None else find_log_segments(path)
+    self._indexed = False
+
+  def index(self):
+    """
+    Counts the lines of every segment in parallel and assigns each one its
+    global `first_line`. Returns the list of segments.
+    """
+    with ThreadPoolExecutor(max_workers=self.workers) as pool:
+      counts = list(pool.map(LogSegment.count_lines, self.segments))
+
+    line = self.first_line
+    for segment, count in zip(self.segments, counts):
+      segment.first_line = line
+      segment.line_count = count
+      line += count
+    self._indexed = True
+    return self.segments
+
+  def line_count(self):
+    """
+    Returns the global line number one past the last line of the log.
+    """
+    if not self._indexed:
+      self.index()
+    return self.first_line + sum(s.line_count for s in self.segments)
+
+  def segment_for_line(self, line):
+    """
+    Returns the segment holding global line number `line`, or None.
+    """
+    if not self._indexed:
+      self.index()
+    for segment in self.segments:
+      if segment.first_line <= line < segment.first_line + segment.line_count:
+        return segment
+    return None
+
+  def segments_for_pages(self, first_page, last_page):
+    """
+    Returns the segments with at least one line hashed on an on-chain page in
+    `first_page..last_page`, inclusive.
+    """
+    if not self._indexed:
+      self.index()
+    result = []
+    for segment in self.segments:
+      span = segment.page_span()
+      if span is not None and span[0] <= last_page and first_page <= span[1]:
+        result.append(segment)
+    return result
+
+  def lines(self, start=None):
+    """
+    Yields `(line_number, line)` pairs for every line of the log, in order,
+    starting at global line number `start` (default: `first_line`). Segments
+    lying entirely before `start` are skipped once the log has been indexed.
+    """
+    for line_number, line, _, _ in self.located_lines(start):
+      yield line_number, line
+
+  def located_lines(self, start=None):
+    """
+    Like `lines`, but yields `(line_number, line, segment, segment_line)`
+    tuples, where `segment_line` is the 1-based line number within `segment`.
+    Useful for reporting where a line came from without re-indexing the log.
+    """
+    if start is None:
+      start = self.first_line
+    if start < self.first_line:
+      raise ValueError(
+        "Line {} precedes the oldest segment on disk".format(start))
+
+    segments = self.segments
+    line_number = self.first_line
+    if start > self.first_line:
+      if not self._indexed:
+        self.index()
+      segments = [s for s in self.segments
+                  if s.first_line + s.line_count > start]
+      if not segments:
+        return
+      line_number = segments[0].first_line
+
+    current = None
+    segment_start = line_number
+    for segment, chunk in self._chunks(segments):
+      if segment is not current:
+        current = segment
+        segment_start = line_number
+      if line_number + len(chunk) <= start:
+        line_number += len(chunk)
+        continue
+      if line_number < start:
+        chunk = chunk[start - line_number:]
+        line_number = start
+      for line in chunk:
+        yield line_number, line, segment, line_number - segment_start + 1
+        line_number += 1
+
+  def __iter__(self):
+    return self.lines()
+
+  def _chunks(self, segments):
+    """
+    Yields `(segment, [lines])` chunks from `segments` in order, keeping up to
+    `self.workers` segments decompressing in background threads.
+    """
+    stop = threading.Event()
+    pending = []
+    remaining = iter(segments)
+
+    def start_next():
+      segment = next(remaining, None)
+      if segment is None:
+        return
+      out = queue.Queue(maxsize=CHUNK_BACKLOG)
+      thread = threading.Thread(
+        target=_decompress_segment, args=(segment, out, stop), daemon=True)
+      thread.start()
+      pending.append((segment, out))
+
+    try:
+      for _ in range(self.workers):
+        start_next()
+      while pending:
+        segment, out = pending.pop(0)
+        start_next()
+        while True:
+          item = out.get()
+          if item is _DONE:
+            break
+          if isinstance(item, Exception):
+            raise item
+          yield segment, item
+    finally:
+      stop.set()
+
+
+def _put(out, item, stop):
+  """
+  Puts `item` on `out`, giving up once the reader has gone away.
+  """
+  while not stop.is_set():
+    try:
+      out.put(item, timeout=0.1)
+      return True
+    except queue.Full:
+      pass
+  return False
+
+
+def _decompress_segment(segment, out, stop):
+  """
+  Thread body: streams `segment` onto `out` in chunks of CHUNK_LINES lines,
+  followed by _DONE (or the exception that stopped it).
+  """
+  try:
+    chunk = []
+    for line in segment.lines():
+      chunk.append(line)
+      if len(chunk) >= CHUNK_LINES:
+        if not _put(out, chunk, stop):
+          return
+        chunk = []
+    if chunk and not _put(out, chunk, stop):
+      return
+    _put(out, _DONE, stop)
+  except Exception as e:  # pylint: disable=broad-except
+    _put(out, e, stop)
@@ -1,7 +1,11 @@
 import sawtooth_signing
 import cbor
 import hashlib
-import urllib.request
+import http.client
+import io
+import threading
+import time
+import urllib.parse
 from urllib.error import HTTPError
 from sawtooth_sdk.protobuf.transaction_pb2 import (TransactionHeader, Transaction)
 from sawtooth_sdk.protobuf.batch_pb2 import (BatchHeader, Batch, BatchList)
@@ -10,6 +14,7 @@ from sawtooth_signing.secp256k1 import (Secp256k1PrivateKey)
 
 import yaml
 import base64
+import json
 
 # Generate a signer for this submitter
 # (it's like a user wallet address in bitcoin?)
@@ -35,20 +40,281 @@ def make_alethia_log_prefix(host, log):
   log_prefix = family + scope
   return log_prefix
 
+# Must match MAX_PAGE_SIZE in alethia_tp/processor/handler.py: the number of
+# entries stored on each on-chain page.
+PAGE_SIZE = 1024
+
 def unpack_page_object(page_object):
-  addrs, data = page_object.split(b"|", 1)
-  prev_addr, next_addr = addrs.split(b",", 1)
+  meta, data = page_object.split(b"|", 1)
+  prev_addr, next_addr, size = meta.split(b",", 2)
   return {
     "prev": prev_addr.decode("utf-8"),
     "next": next_addr.decode("utf-8"),
+    "size": int(size, 10),
     "data": data.decode("utf-8").split(","),
   }
 
+# Statuses that mean the node, not the request, is at fault: the request is
+# retried on another endpoint.
+RETRY_STATUSES = (502, 503, 504)
+
+# Statuses that mean the node is too busy right now, e.g. its batch queue is
+# full: the request is retried on another endpoint, but the node only leaves
+# the rotation for `busy_retry_after` seconds.
+BUSY_STATUSES = (429,)
+
+class RestResponse(object):
+  """
+  A fully-read response from a Sawtooth REST API endpoint. `endpoint` is the
+  URL of the endpoint that answered.
+  """
+
+  def __init__(self, url, status, body, endpoint=None):
+    self.url = url
+    self.endpoint = endpoint
+    self.status = status
+    self._body = io.BytesIO(body)
+
+  def __repr__(self):
+    return "<RestResponse {} {}>".format(self.status, self.url)
+
+  def read(self, amt=None):
+    return self._body.read(amt)
+
+class RestEndpoint(object):
+  """
+  A single Sawtooth REST API endpoint, with a pool of idle keep-alive
+  connections and the bookkeeping `RestPool` uses to balance load across
+  endpoints.
+  """
+
+  def __init__(self, url):
+    parts = urllib.parse.urlsplit(url)
+    self.url = url.rstrip("/")
+    self.scheme = parts.scheme
+    self.host = parts.hostname
+    self.port = parts.port
+    self.base_path = parts.path.rstrip("/")
+    self.idle = []
+    self.outstanding = 0
+    self.failed = False
+    self.down_until = 0.0
+
+  def __repr__(self):
+    return "<RestEndpoint {} outstanding={} failed={}>".format(
+      self.url, self.outstanding, self.failed)
+
+  def connect(self, timeout):
+    if self.scheme == "https":
+      return http.client.HTTPSConnection(self.host, self.port, timeout=timeout)
+    return http.client.HTTPConnection(self.host, self.port, timeout=timeout)
+
+class RestPool(object):
+  """
+  A `RestPool` spreads requests across the REST APIs of several validators.
+  Each request goes to the healthy endpoint with the fewest requests
+  outstanding, taking turns among endpoints that are equally loaded. An endpoint that is down, times out, or answers with a gateway
+  error is taken out of rotation for `retry_after` seconds (`busy_retry_after`
+  if it is merely too busy) and the request is retried on the next endpoint;
+  once that time has passed it must answer a health check before it is used
+  again.
+  """
+
+  def __init__(self, api_urls, *, timeout=10, max_idle=4, retry_after=30,
+               busy_retry_after=1):
+    """
+    api_urls: A URL, or a list of URLs, of Sawtooth REST APIs.
+      Example: ["http://rest-api-0:8008", "http://rest-api-1:8008"]
+    timeout: Seconds to wait on an endpoint before failing over.
+    max_idle: Number of idle keep-alive connections kept per endpoint.
+    retry_after: Seconds an unhealthy endpoint is left out of rotation.
+    busy_retry_after: Seconds an endpoint answering 429 Too Many Requests is
+      left out of rotation.
+    """
+    if isinstance(api_urls, str):
+      api_urls = [api_urls]
+    if not api_urls:
+      raise ValueError("At least one REST API URL is required")
+    self._endpoints = [RestEndpoint(url) for url in api_urls]
+    self._timeout = timeout
+    self._max_idle = max_idle
+    self._retry_after = retry_after
+    self._busy_retry_after = busy_retry_after
+    self._lock = threading.Lock()
+    self._next = 0
+
+  @property
+  def endpoints(self):
+    return list(self._endpoints)
+
+  def request(self, method, path, body=None, headers=None, *, timeout=None,
+              endpoint=None):
+    """
+    Sends a request to the least-loaded healthy endpoint, failing over to the
+    others in turn. Returns a `RestResponse` for a 2xx status.
+    Raises HTTPError for any other status, or with status 503 if no endpoint
+    could be reached.
+
+    path: The request path relative to the API root. Example: "/batches"
+    timeout: Overrides the pool's timeout, e.g. for long-polling requests.
+    endpoint: The URL of an endpoint to send the request to, without failing
+      over. Use this for requests that must see the same validator's view as
+      an earlier one, e.g. the `endpoint` of that request's response. A URL
+      that is not in the pool is ignored.
+    """
+    pinned = None
+    for e in self._endpoints:
+      if e.url == endpoint:
+        pinned = e
+
+    tried = set()
+    while True:
+      if pinned is None:
+        current = self._acquire(tried)
+      elif pinned not in tried:
+        current = pinned
+        with self._lock:
+          current.outstanding += 1
+      else:
+        current = None
+      if current is None:
+        raise HTTPError(path, 503, "No healthy REST API endpoint", {}, None)
+      endpoint = current
+      tried.add(endpoint)
+      try:
+        status, reason, response_headers, data = self._send(
+          endpoint, method, path, body, headers, timeout)
+      except (OSError, http.client.HTTPException) as e:
+        print("REST API " + endpoint.url + " failed: " + str(e))
+        self._release(endpoint, False)
+        continue
+
+      if status in RETRY_STATUSES:
+        print("REST API " + endpoint.url + " unavailable: " + str(status))
+        self._release(endpoint, False)
+        continue
+      if status in BUSY_STATUSES:
+        print("REST API " + endpoint.url + " busy: " + str(status))
+        self._release(endpoint, False, self._busy_retry_after)
+        continue
+      self._release(endpoint, True)
+
+      url = endpoint.url + path
+      if status >= 300:
+        raise HTTPError(url, status, reason, response_headers, io.BytesIO(data))
+      return RestResponse(url, status, data, endpoint.url)
+
+  def _acquire(self, tried):
+    """
+    Picks the endpoint for the next attempt and counts the request against
+    it. Failed endpoints whose retry time has passed are health-checked first,
+    so they rejoin the rotation.
+    """
+    now = time.time()
+    with self._lock:
+      candidates = [e for e in self._endpoints if e not in tried]
+      due = [e for e in candidates if e.failed and e.down_until <= now]
+      for endpoint in due:
+        # Claim the probe so concurrent requests don't all run it.
+        endpoint.down_until = now + self._timeout
+    for endpoint in due:
+      self._health_check(endpoint)
+
+    with self._lock:
+      healthy = [e for e in candidates if not e.failed]
+      if healthy:
+        # Round-robin among the least-loaded endpoints, so a client that
+        # waits for each response still spreads its requests evenly.
+        least = min(e.outstanding for e in healthy)
+        tied = [e for e in healthy if e.outstanding == least]
+        endpoint = min(tied, key=lambda e: (self._endpoints.index(e) - self._next)
+                       % len(self._endpoints))
+        self._next = self._endpoints.index(endpoint) + 1
+        endpoint.outstanding += 1
+        return endpoint
+      # Every endpoint is out of rotation; probe them all rather than give up.
+      remaining = sorted(
+        (e for e in candidates if e not in due), key=lambda e: e.down_until)
+
+    for endpoint in remaining:
+      if self._health_check(endpoint):
+        with self._lock:
+          endpoint.outstanding += 1
+        return endpoint
+      tried.add(endpoint)
+    return None
+
+  def _release(self, endpoint, healthy, retry_after=None):
+    if retry_after is None:
+      retry_after = self._retry_after
+    with self._lock:
+      endpoint.outstanding -= 1
+      endpoint.failed = not healthy
+      if not healthy:
+        endpoint.down_until = time.time() + retry_after
+      if not healthy and retry_after == self._retry_after:
+        for connection in endpoint.idle:
+          connection.close()
+        endpoint.idle = []
+
+  def _health_check(self, endpoint):
+    """
+    Asks `endpoint` for its latest block. Marks it healthy and returns True if
+    it answers.
+    """
+    try:
+      status, _, _, _ = self._send(endpoint, "GET", "/blocks?limit=1", None, None, None)
+    except (OSError, http.client.HTTPException):
+      status = None
+    healthy = status is not None and status < 300
+    with self._lock:
+      endpoint.failed = not healthy
+      if not healthy:
+        endpoint.down_until = time.time() + self._retry_after
+    return healthy
+
+  def _send(self, endpoint, method, path, body, headers, timeout):
+    """
+    Performs one request on a pooled connection to `endpoint` and returns
+    `(status, reason, headers, body)`.
+    """
+    with self._lock:
+      connection = endpoint.idle.pop() if endpoint.idle else None
+
+    while True:
+      reused = connection is not None
+      if connection is None:
+        connection = endpoint.connect(self._timeout)
+      connection.timeout = timeout if timeout is not None else self._timeout
+      if connection.sock is not None:
+        connection.sock.settimeout(connection.timeout)
+      try:
+        connection.request(method, endpoint.base_path + path, body, headers or {})
+        response = connection.getresponse()
+        data = response.read()
+        break
+      except (ConnectionError, http.client.RemoteDisconnected):
+        connection.close()
+        # The node may simply have closed an idle keep-alive connection.
+        if not reused:
+          raise
+        connection = None
+      except BaseException:
+        connection.close()
+        raise
+
+    with self._lock:
+      if response.will_close or len(endpoint.idle) >= self._max_idle:
+        connection.close()
+      else:
+        endpoint.idle.append(connection)
+    return response.status, response.reason, response.headers, data
+
 class Alethia(object):
   """
   An `Alethia` object represents the interactions of a client with an Alethia
-  blockchain instance. The Alethia instance is identified by the URL of its REST
-  API, and the client is identified by a private key.
+  blockchain instance. The Alethia instance is identified by the URLs of its REST
+  APIs, and the client is identified by a private key.
   """
 
   def __init__(self, host, private_key_hex, *, api_url):
@@ -57,14 +323,16 @@ class Alethia(object):
 
     host: A globally-unique string identifying the host whose logs are to be accessed.
     private_key_hex: A hex-encoded private key to use for signing transactions.
-    api_url: The URL of the Sawtooth API. Example: "http://rest-api:8008"
+    api_url: The URL of the Sawtooth API, or a list of URLs of the REST APIs of
+      several validators to spread requests across.
+      Example: "http://rest-api:8008"
     """
     context = sawtooth_signing.create_context('secp256k1')
     private_key = Secp256k1PrivateKey.from_hex(private_key_hex)
 
     self._host = host
     self._signer = CryptoFactory(context).new_signer(private_key)
-    self._api_url = api_url
+    self._pool = api_url if isinstance(api_url, RestPool) else RestPool(api_url)
 
   def get_log_handle(self, log, last_transaction_sig=None):
     """
@@ -77,7 +345,7 @@ class Alethia(object):
       log = alethia.get_log_handle("syslog")
     """
     log_prefix = make_alethia_log_prefix(self._host, log)
-    return AlethiaLog(self._api_url, self._signer, log_prefix, last_transaction_sig)
+    return AlethiaLog(self._pool, self._signer, log_prefix, last_transaction_sig)
 
 class AlethiaLog(object):
   """
@@ -90,18 +358,19 @@ class AlethiaLog(object):
     """
     Constructs an AlethiaLog handle to a blockchain-backed log.
 
-    api_url: The URL of the Sawtooth API. Example: "http://rest-api:8008"
+    api_url: The URL of the Sawtooth API, a list of such URLs, or a `RestPool`
+      shared with other handles. Example: "http://rest-api:8008"
     signer: A sawtooth_signing.Signer instance.
     log_prefix: An address namespace identifying all pages within this log.
     last_transaction_sig: The header signature of a transaction that must commit
       before any subsequent appends should be processed on the blockchain.
     """
-    self._api_url = api_url
+    self._pool = api_url if isinstance(api_url, RestPool) else RestPool(api_url)
     self._signer = signer
     self._log_prefix = log_prefix
     self._last_transaction = last_transaction_sig
 
-  def get_last_transaction_sig():
+  def get_last_transaction_sig(self):
     """
     Get the header signature of the last transaction performed. It's important to
     persist this between runs of the logger so that logs don't get committed out
@@ -110,11 +379,17 @@ class AlethiaLog(object):
     """
     return self._last_transaction
 
-  def append(self, data):
+  def set_last_transaction_sig(self, last_transaction_sig):
     """
-    Appends an integrity proof to the Alethia blockchain.
+    Sets the header signature of the transaction that subsequent appends must
+    depend on, e.g. one restored from a checkpoint.
+    """
+    self._last_transaction = last_transaction_sig
 
-    data: A blob to be appended to the log.
+  def _make_transaction(self, data):
+    """
+    Builds and signs an append transaction for `data`, depending on the last
+    transaction built by this handle.
     """
     # Prepare the payload
     payload_bytes = cbor.dumps({
@@ -152,68 +427,230 @@ class AlethiaLog(object):
     }).SerializeToString()
 
     transaction_header_signture = self._signer.sign(transaction_header_bytes)
-    transaction = Transaction(**{
+    return Transaction(**{
       "header": transaction_header_bytes,
       "header_signature": transaction_header_signture,
       "payload": payload_bytes,
     })
 
+  def _make_batch(self, transactions):
+    """
+    Wraps `transactions` in a signed batch.
+    """
     # Create a batch to contain the transaction
     # Ironically, a batch is more like a transaction than a transaction is.
     # A transaction represents an operation to perform; a batch represents a set of
     # operators for which either all operations commit, or none do.
     batch_header_bytes = BatchHeader(**{
       "signer_public_key": self._signer.get_public_key().as_hex(),
-      "transaction_ids": [transaction.header_signature],
+      "transaction_ids": [t.header_signature for t in transactions],
     }).SerializeToString()
 
-    batch = Batch(**{
+    return Batch(**{
       "header": batch_header_bytes,
       "header_signature": self._signer.sign(batch_header_bytes),
-      "transactions": [transaction],
+      "transactions": transactions,
     })
 
+  def _submit(self, batches):
+    """
+    Submits `batches` to the validator. Returns the URL of the REST API that
+    accepted them, or False on an HTTP error.
+    """
     # `batch_list_bytes` is what must be submitted to the validator.
-    batch_list_bytes = BatchList(batches=[batch]).SerializeToString()
+    batch_list_bytes = BatchList(batches=batches).SerializeToString()
 
     try:
-      request = urllib.request.Request(
-        self._api_url + "/batches",
+      response = self._pool.request(
+        "POST",
+        "/batches",
         batch_list_bytes,
-        method="POST",
         headers={"Content-Type": "application/octet-stream"}
       )
-      response = urllib.request.urlopen(request)
-      # Store this transaction so our next transaction can state a dependency on it.
-      self._last_transaction = transaction_header_signture
       print(response)
-      return True
+      return response.endpoint
     except HTTPError as e:
       print(e)
       return False
 
-  def get_page(self, index):
+  @property
+  def endpoints(self):
     """
-    Gets the designated page of log contents.
-    Returns `{prev: ADDRESS, next: ADDRESS, data: [BLOBS]}`
+    The URLs of the REST APIs this handle sends requests to.
+    """
+    return [e.url for e in self._pool.endpoints]
+
+  def append(self, data):
+    """
+    Appends an integrity proof to the Alethia blockchain.
+
+    data: A blob to be appended to the log.
+    """
+    transaction = self._make_transaction(data)
+    if not self._submit([self._make_batch([transaction])]):
+      return False
+    # Store this transaction so our next transaction can state a dependency on it.
+    self._last_transaction = transaction.header_signature
+    return True
+
+  def make_batches(self, data_list, batch_size=100):
+    """
+    Builds and signs batches appending each of `data_list` to the log,
+    `batch_size` transactions per batch, without submitting them. Each
+    transaction depends on the one before it, so the entries commit in order.
+    Subsequent appends depend on the last of these transactions.
+
+    data_list: A list of blobs to be appended to the log.
+    """
+    batches = []
+    for i in range(0, len(data_list), batch_size):
+      transactions = []
+      for data in data_list[i:i + batch_size]:
+        transaction = self._make_transaction(data)
+        self._last_transaction = transaction.header_signature
+        transactions.append(transaction)
+      batches.append(self._make_batch(transactions))
+    return batches
+
+  def submit_batches(self, batches):
+    """
+    Submits batches built by `make_batches` in a single request. Returns the
+    URL of the REST API that accepted them, or False on an HTTP error, in which
+    case they may or may not have reached a validator. Query their status on
+    the endpoint that accepted them: other validators may not have heard of
+    them yet.
+    """
+    return self._submit(batches)
+
+  def append_many(self, data_list, batch_size=100):
+    """
+    Appends several integrity proofs to the Alethia blockchain in a single
+    request, `batch_size` transactions per batch.
+    Returns a `(batch_id, last_transaction_sig)` pair for each batch submitted,
+    or False on an HTTP error.
+
+    data_list: A list of blobs to be appended to the log.
+    """
+    previous_transaction = self._last_transaction
+    batches = self.make_batches(data_list, batch_size)
+    if not self.submit_batches(batches):
+      self._last_transaction = previous_transaction
+      return False
+    return [(b.header_signature, b.transactions[-1].header_signature) for b in batches]
+
+  def get_batch_statuses(self, batch_ids, wait=None, endpoint=None):
+    """
+    Gets the commit status of each of `batch_ids`, waiting up to `wait` seconds
+    for them to leave the PENDING state. `endpoint` pins the query to the REST
+    API that accepted the batches.
+    Returns `{BATCH_ID: "COMMITTED" | "INVALID" | "PENDING" | "UNKNOWN"}`,
+    or False on an HTTP error.
     """
+    # The ids go in the body: hundreds of them would overflow a query string.
+    path = "/batch_statuses"
+    timeout = None
+    if wait is not None:
+      path += "?wait=" + str(wait)
+      timeout = wait + 10
     try:
-      request = urllib.request.Request(
-        self._api_url + "/state/" + self._log_prefix + "{:016x}".format(index),
-        method="GET"
+      response = self._pool.request(
+        "POST",
+        path,
+        json.dumps(batch_ids).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        timeout=timeout,
+        endpoint=endpoint
       )
-      response = urllib.request.urlopen(request)
+    except HTTPError as e:
+      print(e)
+      return False
+    statuses = json.loads(response.read().decode("utf-8"))["data"]
+    return {s["id"]: s["status"] for s in statuses}
+
+  def _get_page_object(self, index, head=None, endpoint=None):
+    """
+    Gets the designated page as stored on chain, as of block `head` if given.
+    Returns `(page, head, endpoint)`, with page None if it does not exist;
+    `head` and `endpoint` identify the block and REST API the page was read
+    from. Raises HTTPError on any other error.
+    """
+    path = "/state/" + self._log_prefix + "{:016x}".format(index)
+    if head is not None:
+      path += "?head=" + head
+    try:
+      response = self._pool.request("GET", path, endpoint=endpoint)
+    except HTTPError as e:
+      if e.code == 404:
+        return None, head, endpoint
+      raise
+    ydata = yaml.safe_load(response.read(3000000).decode('utf-8'))
+    page = unpack_page_object(base64.b64decode(ydata["data"]))
+    return page, ydata.get("head"), response.endpoint
+
+  def get_log_tail(self):
+    """
+    Gets the number of entries appended to this log so far and the last of
+    them, from its head and tail pages. Every page before the tail holds
+    exactly PAGE_SIZE entries. Both pages are read from the same validator at
+    the same block.
+    Returns `(count, last_entry, head, endpoint)`, with last_entry None for an
+    empty log, or False on an HTTP error. Pass `head` and `endpoint` to
+    `get_page` to read the rest of the log as of the same block.
+    """
+    try:
+      head, block, endpoint = self._get_page_object(0)
+      if head is None:
+        return 0, None, block, endpoint
+      tail_index = int(head["prev"][-16:], 16)
+      if tail_index == 0:
+        tail = head
+      else:
+        tail, _, _ = self._get_page_object(tail_index, block, endpoint)
+    except HTTPError as e:
+      print(e)
+      return False
+    if tail is None:
+      print("Dangling tail page " + str(tail_index))
+      return False
+    count = tail_index * PAGE_SIZE + tail["size"]
+    return count, tail["data"][tail["size"] - 1], block, endpoint
+
+  def get_entry_count(self):
+    """
+    Gets the number of entries appended to this log so far.
+    Returns False on an HTTP error.
+    """
+    tail = self.get_log_tail()
+    if tail is False:
+      return False
+    return tail[0]
+
+  def get_page(self, index, head=None, endpoint=None):
+    """
+    Gets the designated page of log contents, as of block `head` if given.
+    Returns `{prev: ADDRESS, next: ADDRESS, data: [BLOBS]}`
+
+    endpoint: The URL of the REST API to read from, e.g. the one that
+      returned `head`; other validators may not have that block yet.
+    """
+    path = "/state/" + self._log_prefix + "{:016x}".format(index)
+    if head is not None:
+      path += "?head=" + head
+    try:
+      response = self._pool.request("GET", path, endpoint=endpoint)
       print ("status:", response.status)
     except HTTPError as e:
       print(e)
       return False
-    ydata = yaml.load(response.read(3000000).decode('utf-8'))
+    ydata = yaml.safe_load(response.read(3000000).decode('utf-8'))
     obj = unpack_page_object(base64.b64decode(ydata["data"]))
     return obj["data"] # returns just data in list
     #return {k: obj[k] for k in ["head", "tail", "data"]}
 
 if __name__ == "__main__":
   # Testing!
+  # Pass a list of URLs, e.g. ["http://rest-api-0:8008", "http://rest-api-1:8008"],
+  # to spread requests across several validators.
   private_key_hex = make_private_key_hex()
   alethia = Alethia("www.jonathan.com", private_key_hex, api_url="http://rest-api:8008")
   log = alethia.get_log_handle("syslog")
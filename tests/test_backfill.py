@@ -0,0 +1,192 @@
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import backfill
+import logsource
+import verifier
+
+
+class FakeBatch(object):
+  def __init__(self, batch_id, transaction_ids):
+    self.header_signature = batch_id
+    self.transactions = [type("Txn", (), {"header_signature": t}) for t in transaction_ids]
+
+
+class FakeLog(object):
+  """
+  Stands in for submitter.AlethiaLog. Accepted batches commit in order when
+  their status is queried, unless marked invalid; a batch depending on an
+  invalid one stays PENDING forever, as it would in the validator's queue.
+  """
+
+  def __init__(self):
+    self.chain = []
+    self.batches = {}
+    self.statuses = {}
+    self.invalid = set()
+    self.fail_submit = False
+    self.accept_on_failure = False
+    self.auto_commit = True
+    self.last_transaction = None
+    self.submitted = 0
+
+  @property
+  def endpoints(self):
+    return ["http://node"]
+
+  def set_last_transaction_sig(self, sig):
+    self.last_transaction = sig
+
+  def get_last_transaction_sig(self):
+    return self.last_transaction
+
+  def make_batches(self, data_list, batch_size=100):
+    batches = []
+    for i in range(0, len(data_list), batch_size):
+      n = len(self.batches) + len(batches)
+      data = data_list[i:i + batch_size]
+      batch = FakeBatch("b%d" % n, ["t%d.%d" % (n, j) for j in range(len(data))])
+      batch.data = data
+      batch.depends_on = self.last_transaction
+      self.last_transaction = batch.transactions[-1].header_signature
+      batches.append(batch)
+    return batches
+
+  def submit_batches(self, batches):
+    if self.fail_submit and not self.accept_on_failure:
+      return False
+    for batch in batches:
+      self.batches[batch.header_signature] = batch
+      self.statuses[batch.header_signature] = "PENDING"
+      self.submitted += 1
+    return False if self.fail_submit else "http://node"
+
+  def commit(self):
+    committed = set(t.header_signature for b in self.batches.values()
+                    if self.statuses[b.header_signature] == "COMMITTED"
+                    for t in b.transactions[-1:])
+    progress = True
+    while progress:
+      progress = False
+      for batch_id, batch in self.batches.items():
+        if self.statuses[batch_id] != "PENDING":
+          continue
+        if batch.depends_on is not None and batch.depends_on not in committed:
+          continue
+        if batch_id in self.invalid:
+          self.statuses[batch_id] = "INVALID"
+          continue
+        self.statuses[batch_id] = "COMMITTED"
+        self.chain.extend(batch.data)
+        committed.add(batch.transactions[-1].header_signature)
+        progress = True
+
+  def get_batch_statuses(self, batch_ids, wait=None, endpoint=None):
+    if self.auto_commit:
+      self.commit()
+    return {b: self.statuses.get(b, "UNKNOWN") for b in batch_ids}
+
+  def get_log_tail(self):
+    return len(self.chain), self.chain[-1] if self.chain else None, None, None
+
+
+def hashes(path, start=0):
+  return [verifier.gen_hash_of_line_sha256(line)
+          for _, line in logsource.RotatedLog(path).lines(start)]
+
+
+class BackfillTest(unittest.TestCase):
+  def setUp(self):
+    self.dir = tempfile.mkdtemp()
+    self.path = os.path.join(self.dir, "syslog")
+    self.checkpoint = os.path.join(self.dir, "checkpoint.json")
+    with gzip.open(self.path + ".2.gz", "wt") as f:
+      f.write("".join("a%d\n" % i for i in range(250)))
+    with open(self.path + ".1", "w") as f:
+      f.write("".join("b%d\n" % i for i in range(100)))
+    with open(self.path, "w") as f:
+      f.write("".join("c%d\n" % i for i in range(50)))
+    self.log = FakeLog()
+
+  def tearDown(self):
+    shutil.rmtree(self.dir)
+
+  def run_backfill(self, first_line=0, **kwargs):
+    kwargs.setdefault("chunk_lines", 60)
+    kwargs.setdefault("batch_size", 25)
+    kwargs.setdefault("wait", 0)
+    kwargs.setdefault("max_wait", 0)
+    source = logsource.RotatedLog(self.path, first_line=first_line)
+    return backfill.backfill(self.log, source, self.checkpoint, **kwargs)
+
+  def test_uploads_every_line_once(self):
+    self.assertTrue(self.run_backfill())
+    self.assertEqual(self.log.chain, hashes(self.path))
+    self.assertTrue(self.run_backfill())
+    self.assertEqual(self.log.chain, hashes(self.path))
+
+  def test_resumes_after_new_lines(self):
+    self.assertTrue(self.run_backfill())
+    with open(self.path, "a") as f:
+      f.write("d0\nd1\n")
+    self.assertTrue(self.run_backfill())
+    self.assertEqual(self.log.chain, hashes(self.path))
+
+  def test_failed_submit_that_was_accepted_is_not_resent(self):
+    self.log.fail_submit = True
+    self.log.accept_on_failure = True
+    self.assertFalse(self.run_backfill())
+    pending = json.load(open(self.checkpoint))["pending"]
+    self.assertTrue(pending)
+    self.assertIsNone(pending[0]["endpoint"])
+
+    self.log.fail_submit = False
+    self.assertTrue(self.run_backfill())
+    self.assertEqual(self.log.chain, hashes(self.path))
+
+  def test_failed_submit_that_was_dropped_is_resent(self):
+    self.log.fail_submit = True
+    self.assertFalse(self.run_backfill())
+    self.log.fail_submit = False
+    self.assertTrue(self.run_backfill())
+    self.assertEqual(self.log.chain, hashes(self.path))
+
+  def test_invalid_batch_does_not_block_rerun(self):
+    self.log.invalid.add("b1")
+    self.assertFalse(self.run_backfill())
+    self.assertTrue(self.run_backfill())
+    self.assertEqual(self.log.chain, hashes(self.path))
+    self.assertEqual(json.load(open(self.checkpoint))["pending"], [])
+
+  def test_gives_up_on_stuck_batches(self):
+    self.log.auto_commit = False
+    self.assertFalse(self.run_backfill())
+    self.assertTrue(json.load(open(self.checkpoint))["pending"])
+    self.log.commit()
+    self.log.auto_commit = True
+    self.assertTrue(self.run_backfill())
+    self.assertEqual(self.log.chain, hashes(self.path))
+
+  def test_rejects_stale_first_line(self):
+    self.assertTrue(self.run_backfill())
+    os.remove(self.path + ".2.gz")
+    with open(self.path, "a") as f:
+      f.write("".join("d%d\n" % i for i in range(300)))
+    submitted = self.log.submitted
+
+    self.assertFalse(self.run_backfill())
+    self.assertEqual(self.log.submitted, submitted)
+    self.assertTrue(self.run_backfill(first_line=250))
+    self.assertEqual(self.log.chain[250:], hashes(self.path))
+
+  def test_rejects_first_line_past_chain(self):
+    self.assertFalse(self.run_backfill(first_line=10))
+    self.assertEqual(self.log.chain, [])
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -0,0 +1,86 @@
+import gzip
+import os
+import shutil
+import tempfile
+import unittest
+
+import logsource
+
+
+class RotatedLogTest(unittest.TestCase):
+  def setUp(self):
+    self.dir = tempfile.mkdtemp()
+    self.path = os.path.join(self.dir, "syslog")
+    # Oldest first: syslog.10.gz, syslog.2.gz, syslog.1, syslog.
+    self.write("syslog.10.gz", ["a%d" % i for i in range(5000)])
+    self.write("syslog.2.gz", ["b%d" % i for i in range(300)])
+    self.write("syslog.1", ["c%d" % i for i in range(20)])
+    self.write("syslog", ["d%d" % i for i in range(7)], partial="d7")
+    self.write("syslog.old", ["x"])
+    self.write("messages", ["x"])
+    self.lines = (["a%d" % i for i in range(5000)] + ["b%d" % i for i in range(300)]
+                  + ["c%d" % i for i in range(20)] + ["d%d" % i for i in range(7)])
+
+  def tearDown(self):
+    shutil.rmtree(self.dir)
+
+  def write(self, name, lines, partial=""):
+    text = "".join(line + "\n" for line in lines) + partial
+    path = os.path.join(self.dir, name)
+    if name.endswith(".gz"):
+      with gzip.open(path, "wt") as f:
+        f.write(text)
+    else:
+      with open(path, "w") as f:
+        f.write(text)
+
+  def test_find_log_segments(self):
+    segments = logsource.find_log_segments(self.path)
+    self.assertEqual([os.path.basename(s.path) for s in segments],
+                     ["syslog.10.gz", "syslog.2.gz", "syslog.1", "syslog"])
+    self.assertEqual([s.codec for s in segments], ["gzip", "gzip", None, None])
+    self.assertEqual([s.live for s in segments], [False, False, False, True])
+
+  def test_lines_in_order(self):
+    log = logsource.RotatedLog(self.path, workers=2)
+    self.assertEqual(list(log), list(enumerate(self.lines)))
+
+  def test_skips_partial_live_line(self):
+    log = logsource.RotatedLog(self.path)
+    self.assertEqual(log.line_count(), len(self.lines))
+    self.assertEqual(list(log)[-1], (len(self.lines) - 1, "d6"))
+    with open(self.path, "a") as f:
+      f.write("\n")
+    self.assertEqual(list(logsource.RotatedLog(self.path))[-1], (len(self.lines), "d7"))
+
+  def test_lines_from_start(self):
+    log = logsource.RotatedLog(self.path)
+    for start in [0, 1, 4095, 4096, 4999, 5000, 5310, len(self.lines) - 1, len(self.lines)]:
+      self.assertEqual(list(log.lines(start)), list(enumerate(self.lines))[start:])
+
+  def test_first_line_offset(self):
+    log = logsource.RotatedLog(self.path, first_line=1000)
+    self.assertEqual(next(iter(log)), (1000, "a0"))
+    self.assertEqual(next(log.lines(6000)), (6000, "b0"))
+    with self.assertRaises(ValueError):
+      next(log.lines(999))
+
+  def test_located_lines(self):
+    log = logsource.RotatedLog(self.path)
+    line_number, line, segment, segment_line = next(log.located_lines(5302))
+    self.assertEqual((line_number, line), (5302, "c2"))
+    self.assertEqual(os.path.basename(segment.path), "syslog.1")
+    self.assertEqual(segment_line, 3)
+
+  def test_segments_for_pages(self):
+    log = logsource.RotatedLog(self.path)
+    names = lambda segments: [os.path.basename(s.path) for s in segments]
+    self.assertEqual(names(log.segments_for_pages(0, 3)), ["syslog.10.gz"])
+    self.assertEqual(names(log.segments_for_pages(4, 4)), ["syslog.10.gz", "syslog.2.gz"])
+    self.assertEqual(names(log.segments_for_pages(5, 5)),
+                     ["syslog.2.gz", "syslog.1", "syslog"])
+    self.assertEqual(log.segment_for_line(5319).path, os.path.join(self.dir, "syslog.1"))
+
+
+if __name__ == "__main__":
+  unittest.main()
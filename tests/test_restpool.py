@@ -0,0 +1,103 @@
+import http.server
+import json
+import threading
+import unittest
+from urllib.error import HTTPError
+
+import submitter
+
+
+class StubNode(object):
+  """
+  A REST API that answers every request with `status` and counts the
+  requests it has seen.
+  """
+
+  def __init__(self, status=200):
+    self.status = status
+    self.hits = 0
+    node = self
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+      protocol_version = "HTTP/1.1"
+
+      def log_message(self, *args):
+        pass
+
+      def reply(self):
+        node.hits += 1
+        length = int(self.headers.get("Content-Length") or 0)
+        self.rfile.read(length)
+        body = json.dumps({"node": node.url}).encode()
+        self.send_response(node.status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+      do_GET = reply
+      do_POST = reply
+
+    self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    self.url = "http://127.0.0.1:%d" % self.server.server_port
+    threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+  def close(self):
+    self.server.shutdown()
+    self.server.server_close()
+
+
+class RestPoolTest(unittest.TestCase):
+  def setUp(self):
+    self.nodes = []
+
+  def tearDown(self):
+    for node in self.nodes:
+      node.close()
+
+  def make_pool(self, *statuses, **kwargs):
+    self.nodes = [StubNode(status) for status in statuses]
+    return submitter.RestPool([n.url for n in self.nodes], timeout=2, **kwargs)
+
+  def test_round_robin(self):
+    pool = self.make_pool(200, 200, 200)
+    for _ in range(9):
+      pool.request("GET", "/blocks")
+    self.assertEqual([n.hits for n in self.nodes], [3, 3, 3])
+
+  def test_fails_over_on_503(self):
+    pool = self.make_pool(503, 200)
+    for _ in range(4):
+      response = pool.request("GET", "/blocks")
+      self.assertEqual(response.endpoint, self.nodes[1].url)
+    # The failed node is left alone until retry_after has passed.
+    self.assertEqual(self.nodes[0].hits, 1)
+
+  def test_fails_over_on_429_and_rejoins(self):
+    pool = self.make_pool(429, 200, busy_retry_after=0)
+    response = pool.request("POST", "/batches", b"x")
+    self.assertEqual(response.endpoint, self.nodes[1].url)
+    self.nodes[0].status = 200
+    endpoints = set(pool.request("GET", "/blocks").endpoint for _ in range(4))
+    self.assertEqual(endpoints, set(n.url for n in self.nodes))
+
+  def test_all_down(self):
+    pool = self.make_pool(503, 502)
+    with self.assertRaises(HTTPError) as raised:
+      pool.request("GET", "/blocks")
+    self.assertEqual(raised.exception.code, 503)
+
+  def test_pinned_request_does_not_fail_over(self):
+    pool = self.make_pool(503, 200)
+    with self.assertRaises(HTTPError):
+      pool.request("GET", "/state/x", endpoint=self.nodes[0].url)
+    self.assertEqual(self.nodes[1].hits, 0)
+
+  def test_other_errors_are_raised(self):
+    pool = self.make_pool(404, 200)
+    with self.assertRaises(HTTPError) as raised:
+      pool.request("GET", "/state/x", endpoint=self.nodes[0].url)
+    self.assertEqual(raised.exception.code, 404)
+
+
+if __name__ == "__main__":
+  unittest.main()
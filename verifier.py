@@ -8,6 +8,7 @@ log and log-hash pairs.
 import hashlib
 import time
 
+import logsource
 import submitter
 
 def verify_log_files_sha256(path_to_log_file, path_to_hash_file):
@@ -145,6 +146,83 @@ def download_and_verify(alethia_log, path_to_log_file, num_pages):
   print(str(elapsed_time) + " seconds to verify")
   return elapsed_time, bool_is_log_modified
 
+def upload_hashes_from_log_source(alethia_log, log_source, start=None):
+  """
+  Appends log-hashes to the blockchain from a `logsource.RotatedLog`, starting
+  at global line number `start` (default: its first line). Rotated and compressed segments are streamed
+  in order, so nothing is decompressed to disk.
+  Stops at the first line that fails to append. Returns `(elapsed_time,
+  next_line)`, where next_line is the line to pass as `start` to resume.
+  """
+  start_time = time.time()
+  if start is None:
+    start = log_source.first_line
+  next_line = start
+  for line_number, log_line in log_source.lines(start):
+    if not alethia_log.append(gen_hash_of_line_sha256(log_line)):
+      print("Error appending line " + str(line_number))
+      break
+    next_line = line_number + 1
+    time.sleep(0.1)  # need this otherwise sawtooth cant handle all the requests for some reason
+  elapsed_time = time.time() - start_time
+  print(str(elapsed_time) + " seconds to upload " + str(next_line - start) + " lines of "
+        + str(log_source.path))
+  return elapsed_time, next_line
+
+def download_and_verify_log_source(alethia_log, log_source, first_page=0):
+  """
+  Verifies a `logsource.RotatedLog` against its log-hashes, starting at on-chain
+  page `first_page`. Each page is fetched once, as the line stream reaches it,
+  from the validator and block the entry count was read at, so the pages
+  agree with the count even while other validators lag or the log grows.
+  Prints the global line number and segment of every line that doesn't match.
+  Lines past the last on-chain entry have not been uploaded yet; they are
+  reported separately and don't count as modifications.
+  Use `log_source.segments_for_pages` to find the pages covering a segment.
+  """
+  bool_is_log_modified = False
+  start_time = time.time()
+  start = max(first_page * submitter.PAGE_SIZE, log_source.first_line)
+  tail = alethia_log.get_log_tail()
+  if tail is False:
+    print("Error reading the on-chain entry count")
+    return time.time() - start_time, True
+  entry_count, _, head, endpoint = tail
+
+  page_index = None
+  page_list = []
+  counter = 0
+  unanchored = 0
+  end = start
+  for line_number, log_line, segment, segment_line in log_source.located_lines(start):
+    end = line_number + 1
+    if line_number >= entry_count:
+      unanchored += 1
+      continue
+    if line_number // submitter.PAGE_SIZE != page_index:
+      page_index = line_number // submitter.PAGE_SIZE
+      page_list = alethia_log.get_page(page_index, head, endpoint)
+      if page_list == False:
+        print("Error on page " + str(page_index))
+        bool_is_log_modified = True
+        break
+    offset = line_number % submitter.PAGE_SIZE
+    if offset >= len(page_list) or gen_hash_of_line_sha256(log_line) != page_list[offset]:
+      print("Error on line " + str(line_number) + " (" + segment.path + ":"
+            + str(segment_line) + ")")
+      bool_is_log_modified = True
+    counter += 1
+  else:
+    if end < entry_count:
+      print(str(entry_count - end) + " on-chain entries from line " + str(end)
+            + " have no line in the log")
+      bool_is_log_modified = True
+  if unanchored:
+    print(str(unanchored) + " lines from line " + str(entry_count) + " are not anchored yet")
+  elapsed_time = time.time() - start_time
+  print(str(elapsed_time) + " seconds to verify " + str(counter) + " lines")
+  return elapsed_time, bool_is_log_modified
+
 if __name__ == "__main__":
   # Test Setup
   # Test files located in folder test_case_logs: foo.log and bar.txt
@@ -176,6 +254,13 @@ if __name__ == "__main__":
   #upload_hashes_from_log_file(log, path_to_log_file)
   # Get data from blockchain and verify 
   #download_and_verify(log, path_to_log_file, 2)
+
+  # Test 4: Rotated log with blockchain
+  #
+  # Covers syslog.N.gz ... syslog.1, syslog as one stream of lines
+  #rotated_log = logsource.RotatedLog("/var/log/syslog")
+  #upload_hashes_from_log_source(log, rotated_log)
+  #download_and_verify_log_source(log, rotated_log)
   
   # Test 3: Verifier by itself
   #